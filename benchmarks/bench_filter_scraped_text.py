@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Micro-benchmark for filter_scraped_text: the old per-call pattern list + re.match loop
+versus the precompiled single-pass filter in "Source code.py".
+
+Usage: python benchmarks/bench_filter_scraped_text.py [number_of_texts]
+"""
+import importlib.util
+import os
+import random
+import re
+import sys
+import time
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Source code.py")
+
+
+def load_bot_module():
+    spec = importlib.util.spec_from_file_location("whatsapp_bot", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def filter_scraped_text_legacy(text):
+    if not text or not text.strip():
+        return None
+    text = text.strip()
+    junk_patterns = [
+        r"^\d{1,2}:\d{2}\s+(AM|PM)$",
+        r"^tail-in$",
+        r"^forward-chat$",
+        r"^Select message$",
+    ]
+    for pattern in junk_patterns:
+        if re.match(pattern, text, re.IGNORECASE):
+            return None
+    return text
+
+
+def build_sample_texts(count, seed=42):
+    rng = random.Random(seed)
+    junk = ["10:42 AM", " 9:05 pm ", "tail-in", "forward-chat", "Select message", "", "   "]
+    words = ["hello", "price", "order", "delivery", "thanks", "tomorrow", "ok", "how much", "available?"]
+    texts = []
+    for _ in range(count):
+        if rng.random() < 0.6:
+            texts.append(rng.choice(junk))
+        else:
+            texts.append(" ".join(rng.choice(words) for _ in range(rng.randint(1, 12))))
+    return texts
+
+
+def time_filter(filter_func, texts, repeats=5):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for text in texts:
+            filter_func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+if __name__ == "__main__":
+    text_count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    bot = load_bot_module()
+    texts = build_sample_texts(text_count)
+
+    mismatches = sum(1 for text in texts if filter_scraped_text_legacy(text) != bot.filter_scraped_text(text))
+    if mismatches:
+        print(f"Warning: {mismatches} texts filtered differently (enabled rule sets: {bot.SCRAPED_TEXT_FILTER_RULE_SETS_ENABLED}).")
+
+    legacy_seconds = time_filter(filter_scraped_text_legacy, texts)
+    compiled_seconds = time_filter(bot.filter_scraped_text, texts)
+    print(f"Texts: {text_count}")
+    print(f"Legacy pattern loop : {legacy_seconds:.3f}s ({legacy_seconds / text_count * 1e6:.2f} us/text)")
+    print(f"Precompiled filter  : {compiled_seconds:.3f}s ({compiled_seconds / text_count * 1e6:.2f} us/text)")
+    print(f"Speedup: {legacy_seconds / compiled_seconds:.2f}x")
@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+import importlib.util
+import os
+
+import pytest
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Source code.py")
+
+
+@pytest.fixture(scope="session")
+def bot():
+    """The bot script loaded as a module (browser start and Gemini checks only run under __main__)."""
+    for dependency in ("selenium", "chromedriver_autoinstaller", "google.generativeai", "bs4", "PIL"):
+        pytest.importorskip(dependency)
+    spec = importlib.util.spec_from_file_location("whatsapp_bot", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
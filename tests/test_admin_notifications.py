@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeSummaryClient:
+    """Raises the queued errors first, then returns a fixed summary."""
+    def __init__(self, errors=None):
+        self.errors = list(errors or [])
+        self.calls = 0
+
+    def generate_content(self, contents, **kwargs):
+        self.calls += 1
+        if self.errors: raise self.errors.pop(0)
+        return SimpleNamespace(text="Client wants a booking bot.")
+
+
+@pytest.fixture
+def admin_queue(bot, tmp_path, monkeypatch):
+    history_file = str(tmp_path / "whatsapp_chat_client.json")
+    bot.save_json([{"role": "user", "parts": ["hi"]}, {"role": "model", "parts": ["hello"]}], history_file)
+    monkeypatch.setattr(bot, "admin_notification_queue", [])
+    monkeypatch.setattr(bot, "ADMIN_NOTIFICATION_QUEUE_FILE", str(tmp_path / "admin_notification_queue.json"))
+    bot.enqueue_admin_notification("Client", history_file, bot.ADMIN_NOTIFICATION_QUEUE_FILE)
+    return bot.admin_notification_queue
+
+
+def test_model_error_is_not_cached_as_summary(bot, admin_queue, monkeypatch):
+    client = FakeSummaryClient(errors=[RuntimeError("429 quota")])
+    monkeypatch.setattr(bot, "reply_client", client)
+    item = admin_queue[0]
+
+    assert bot.get_admin_notification_summary(item) is None
+    assert "summary" not in item
+    assert bot.get_admin_notification_summary(item) == "Client wants a booking bot."
+    assert bot.get_admin_notification_summary(item) == "Client wants a booking bot."
+    assert client.calls == 2
+
+
+def test_repeated_failures_fall_back_to_manual_review_note(bot, admin_queue, monkeypatch):
+    errors = [RuntimeError("circuit open")] * bot.ADMIN_NOTIFICATION_MAX_ATTEMPTS
+    monkeypatch.setattr(bot, "reply_client", FakeSummaryClient(errors=errors))
+    item = admin_queue[0]
+
+    summaries = [bot.get_admin_notification_summary(item) for _ in range(bot.ADMIN_NOTIFICATION_MAX_ATTEMPTS)]
+
+    assert summaries[:-1] == [None] * (bot.ADMIN_NOTIFICATION_MAX_ATTEMPTS - 1)
+    assert "Please review manually" in summaries[-1]
+
+
+def test_immediate_mode_reuses_summary_across_failed_sends(bot, admin_queue, monkeypatch):
+    client = FakeSummaryClient()
+    sent_messages = []
+    monkeypatch.setattr(bot, "reply_client", client)
+    monkeypatch.setattr(bot, "has_unread_chat", lambda driver: False)
+    monkeypatch.setattr(bot, "watchdog_heartbeat", lambda: None)
+    monkeypatch.setattr(bot, "send_message_to_whatsapp_contact", lambda driver, phone, text, **kwargs: sent_messages.append(text) or False)
+    monkeypatch.setattr(bot.scheduler_rate_limiters[bot.PRIORITY_ADMIN], "try_acquire", lambda: True)
+
+    for _ in range(2):
+        assert bot.run_immediate_admin_work(None, bot.time.monotonic(), bot.ADMIN_NOTIFICATION_QUEUE_FILE) == 0
+
+    assert client.calls == 1
+    assert len(sent_messages) == 2
+    assert admin_queue[0]["summary"] == "Client wants a booking bot."
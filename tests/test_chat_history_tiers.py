@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+
+@pytest.fixture
+def tiers(bot, tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, "CHAT_HISTORY_ARCHIVE_FOLDER", str(tmp_path / "archive"))
+    monkeypatch.setattr(bot, "CHAT_HISTORY_ROLLING_SUMMARY_ENABLED", False)
+    return bot
+
+
+def make_history(count):
+    return [{"role": "user" if index % 2 == 0 else "model", "parts": [f"message {index}"]} for index in range(count)]
+
+
+def test_compaction_keeps_hot_tail_and_archives_whole_segments(tiers, tmp_path):
+    history_file = str(tmp_path / "whatsapp_chat_client.json")
+    history = make_history(1300)
+    tiers.save_json(history, history_file)
+
+    hot_history = tiers.load_chat_history(history_file)
+
+    assert len(hot_history) == 300
+    assert len(tiers.load_chat_archive_manifest(history_file)) == 2
+    assert tiers.load_full_chat_history(history_file) == history
+
+
+def test_crash_before_hot_rewrite_does_not_duplicate_segments(tiers, tmp_path, monkeypatch):
+    history_file = str(tmp_path / "whatsapp_chat_client.json")
+    history = make_history(1300)
+    tiers.save_json(history, history_file)
+
+    real_save_json = tiers.save_json
+    def save_json_crashing_on_hot_file(data, filename):
+        if filename == history_file: return False # Killed after the segments and manifest were written
+        return real_save_json(data, filename)
+    monkeypatch.setattr(tiers, "save_json", save_json_crashing_on_hot_file)
+    tiers.load_chat_history(history_file)
+    assert len(tiers.load_chat_archive_manifest(history_file)) == 2
+    assert len(tiers.load_json(history_file)) == 1300 # Hot file was not rewritten
+
+    monkeypatch.setattr(tiers, "save_json", real_save_json)
+    hot_history = tiers.load_chat_history(history_file)
+
+    assert len(hot_history) == 300
+    assert len(tiers.load_chat_archive_manifest(history_file)) == 2
+    assert tiers.load_full_chat_history(history_file) == history
+
+
+def test_recovery_archives_new_turns_after_the_crashed_segments(tiers, tmp_path, monkeypatch):
+    history_file = str(tmp_path / "whatsapp_chat_client.json")
+    history = make_history(1300)
+    tiers.save_json(history, history_file)
+
+    real_save_json = tiers.save_json
+    monkeypatch.setattr(tiers, "save_json", lambda data, filename: False if filename == history_file else real_save_json(data, filename))
+    tiers.load_chat_history(history_file)
+    monkeypatch.setattr(tiers, "save_json", real_save_json)
+
+    history += make_history(1800)[1300:] # The chat kept going before the next load
+    real_save_json(history, history_file)
+    hot_history = tiers.load_chat_history(history_file)
+
+    assert len(hot_history) == 300
+    assert len(tiers.load_chat_archive_manifest(history_file)) == 3
+    assert tiers.load_full_chat_history(history_file) == history
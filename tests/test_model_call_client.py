@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history)
+
+    def send_message(self, content):
+        response = self.model.respond(content)
+        self.history += [{"role": "user", "parts": content}, {"role": "model", "parts": [response.text]}]
+        return response
+
+
+class FakeModel:
+    """Answers with a numbered reply, or raises the queued errors first."""
+    def __init__(self, errors=None):
+        self.errors = list(errors or [])
+        self.calls = []
+        self.block_until = None # threading.Event that calls wait on, to hold a call in flight
+        self.started = threading.Event()
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history or [])
+
+    def generate_content(self, contents, **kwargs):
+        return self.respond(contents)
+
+    def respond(self, content):
+        self.calls.append(content)
+        self.started.set()
+        if self.block_until is not None: self.block_until.wait(5)
+        if self.errors: raise self.errors.pop(0)
+        return SimpleNamespace(text=f"reply {len(self.calls)}")
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def make_client(bot, clock):
+    def make_client(model):
+        rate_limiter = bot.TokenBucket(600, 100, clock=clock, sleep=clock.sleep)
+        return bot.ModelCallClient(model, "fake-model", rate_limiter=rate_limiter, clock=clock, sleep=clock.sleep)
+    return make_client
+
+
+def test_token_bucket_waits_for_refill(bot, clock):
+    bucket = bot.TokenBucket(60, 2, clock=clock, sleep=clock.sleep)
+    bucket.acquire()
+    bucket.acquire()
+    assert clock.sleeps == []
+    bucket.acquire()
+    assert clock.sleeps == [pytest.approx(1.0)]
+    assert not bucket.try_acquire()
+
+
+def test_token_bucket_penalize_delays_next_acquire(bot, clock):
+    bucket = bot.TokenBucket(60, 5, clock=clock, sleep=clock.sleep)
+    bucket.penalize(10)
+    assert not bucket.try_acquire()
+    bucket.acquire()
+    assert sum(clock.sleeps) == pytest.approx(11.0)
+
+
+def test_transient_errors_are_retried_with_backoff(bot, make_client, clock, monkeypatch):
+    monkeypatch.setattr(bot.random, "uniform", lambda low, high: high)
+    model = FakeModel(errors=[bot.google_api_exceptions.ServiceUnavailable("busy"), bot.google_api_exceptions.ServiceUnavailable("busy")])
+    response = make_client(model).generate_content(["hi"])
+    assert response.text == "reply 3"
+    assert clock.sleeps == [bot.MODEL_RETRY_BASE_DELAY, bot.MODEL_RETRY_BASE_DELAY * 2]
+
+
+def test_server_retry_delay_is_respected(bot, make_client, clock, monkeypatch):
+    monkeypatch.setattr(bot.random, "uniform", lambda low, high: high)
+    model = FakeModel(errors=[bot.google_api_exceptions.ResourceExhausted("quota retry_delay { seconds: 17 }")])
+    make_client(model).generate_content(["hi"])
+    assert max(clock.sleeps) == 17
+
+
+def test_non_retryable_errors_are_raised_immediately(bot, make_client):
+    model = FakeModel(errors=[ValueError("bad request")])
+    with pytest.raises(ValueError):
+        make_client(model).generate_content(["hi"])
+    assert len(model.calls) == 1
+
+
+def test_circuit_breaker_opens_and_recovers(bot, make_client, clock, monkeypatch):
+    monkeypatch.setattr(bot, "MODEL_CIRCUIT_BREAKER_THRESHOLD", 2)
+    model = FakeModel(errors=[bot.google_api_exceptions.ServiceUnavailable("down")] * 2)
+    client = make_client(model)
+    with pytest.raises(bot.google_api_exceptions.ServiceUnavailable):
+        client.generate_content(["hi"])
+    with pytest.raises(bot.ModelCircuitOpenError):
+        client.generate_content(["hi"])
+    assert len(model.calls) == 2
+    clock.now += bot.MODEL_CIRCUIT_BREAKER_COOLDOWN + 1
+    assert client.generate_content(["hi"]).text == "reply 3"
+
+
+def test_same_text_on_consecutive_turns_is_not_coalesced(make_client):
+    model = FakeModel()
+    client = make_client(model)
+    chat_session = client.start_chat()
+    first = client.send_message(chat_session, ["yes"], coalesce_key="contact")
+    second = client.send_message(chat_session, ["yes"], coalesce_key="contact")
+    assert len(model.calls) == 2
+    assert first.text != second.text
+
+
+def test_identical_request_within_window_is_reused(make_client):
+    model = FakeModel()
+    client = make_client(model)
+    first = client.generate_content([{"role": "user", "parts": ["hi"]}], coalesce_key="contact")
+    second = client.generate_content([{"role": "user", "parts": ["hi"]}], coalesce_key="contact")
+    assert len(model.calls) == 1
+    assert second is first
+
+
+def test_identical_in_flight_calls_are_coalesced(make_client):
+    model = FakeModel()
+    model.block_until = threading.Event()
+    client = make_client(model)
+    results = []
+    callers = [threading.Thread(target=lambda: results.append(client.generate_content(["hi"], coalesce_key="contact"))) for _ in range(2)]
+    callers[0].start()
+    assert model.started.wait(5)
+    callers[1].start()
+    time.sleep(0.2) # Let the second caller reach the in-flight wait
+    model.block_until.set()
+    for caller in callers: caller.join(5)
+    assert len(model.calls) == 1
+    assert results[0] is results[1]
+
+
+def test_coalescing_is_scoped_to_the_contact_key(make_client):
+    model = FakeModel()
+    client = make_client(model)
+    client.send_message(client.start_chat(), ["hello"], coalesce_key="97450000001_c_us")
+    client.send_message(client.start_chat(), ["hello"], coalesce_key="97450000002_c_us")
+    assert len(model.calls) == 2
+
+
+def test_session_cache_reuses_session_after_recorded_reply(bot, make_client):
+    client = make_client(FakeModel())
+    session_cache = bot.ChatSessionCache(client)
+    stored_history = [{"role": "user", "parts": ["hi"]}]
+    chat_session = session_cache.get_session("contact", [], [])
+    reply = client.send_message(chat_session, ["hi"])
+    stored_history.append({"role": "model", "parts": [reply.text]})
+    session_cache.mark_synced("contact", stored_history)
+    assert session_cache.get_session("contact", stored_history, stored_history) is chat_session
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""
+Offline analytics export over every chat history written by "Source code.py".
+
+Scans CHAT_HISTORY_BASE_FOLDER (hot files plus compressed archive segments) with a process pool,
+joins the outreach ledger (messaged_contacts.txt), the contact index and the closed-leads log, and
+writes one row per contact to CSV or Parquet. Re-runs only re-read history files whose size or
+modification time changed since the last export.
+
+Usage:
+    python tools/export_chat_analytics.py [--output chat_analytics.csv] [--format csv|parquet] [--workers N] [--full]
+"""
+import argparse
+import csv
+import glob
+import gzip
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import pyarrow as pa # Optional: only needed for --format parquet
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Defaults mirror the configuration in "Source code.py"
+CHAT_HISTORY_BASE_FOLDER = "whatsapp_chats"
+CHAT_HISTORY_ARCHIVE_FOLDER = os.path.join(CHAT_HISTORY_BASE_FOLDER, "archive")
+MESSAGED_CONTACTS_FILE = "messaged_contacts.txt"
+CONTACT_INDEX_FILE = "contact_index.json"
+CLOSED_LEADS_FILE = "closed_leads.jsonl"
+ANALYTICS_STATE_FILE = "chat_analytics_state.json" # Per-file signatures and cached rows for incremental runs
+
+HISTORY_FILE_PREFIX = "whatsapp_chat_"
+IMAGE_PLACEHOLDER_PREFIX = "<Image received"
+
+CHAT_COLUMNS = [
+    "contact_key", "total_turns", "user_turns", "model_turns", "image_turns", "archived_segments",
+    "user_bursts", "answered_bursts", "first_role", "last_role", "avg_user_chars", "avg_model_chars",
+    "history_modified_at",
+]
+JOINED_COLUMNS = [
+    "contact_id", "display_name", "aliases", "first_seen", "outreach_contacted", "client_replied",
+    "reply_rate", "closings", "first_closed_at", "turns_to_close", "seconds_to_close",
+]
+
+
+def read_json_list(filename):
+    try:
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else []
+    except (IOError, ValueError):
+        return []
+
+
+def read_json_gz_list(filename):
+    try:
+        with gzip.open(filename, 'rt', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, list) else []
+    except (IOError, EOFError, ValueError):
+        return []
+
+
+def read_jsonl(filename):
+    records = []
+    if not os.path.exists(filename): return records
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line: continue
+            try: records.append(json.loads(line))
+            except ValueError: print(f"Warning: Skipping malformed line in {filename}.")
+    return records
+
+
+def contact_key_from_history_file(history_file):
+    return os.path.splitext(os.path.basename(history_file))[0][len(HISTORY_FILE_PREFIX):]
+
+
+def get_file_signature(history_file, archive_folder):
+    """Size and mtime of the hot file and the archive manifest; a change in either triggers a re-read."""
+    stat = os.stat(history_file)
+    manifest_file = os.path.join(archive_folder, os.path.splitext(os.path.basename(history_file))[0], "manifest.json")
+    manifest_mtime = os.stat(manifest_file).st_mtime_ns if os.path.exists(manifest_file) else 0
+    return [stat.st_size, stat.st_mtime_ns, manifest_mtime]
+
+
+def summarize_chat_file(history_file, archive_folder):
+    """Per-contact aggregates for one chat (runs in a worker process)."""
+    archive_dir = os.path.join(archive_folder, os.path.splitext(os.path.basename(history_file))[0])
+    manifest = read_json_list(os.path.join(archive_dir, "manifest.json"))
+    history = []
+    for segment in manifest:
+        history.extend(read_json_gz_list(os.path.join(archive_dir, segment.get("file", ""))))
+    history.extend(read_json_list(history_file))
+
+    texts_by_role = {"user": [], "model": []}
+    image_turns = user_bursts = answered_bursts = 0
+    previous_role = None
+    for entry in history:
+        role = entry.get("role") if isinstance(entry, dict) else None
+        parts = entry.get("parts") if isinstance(entry, dict) else None
+        text = parts[0] if parts and isinstance(parts[0], str) else ""
+        if role not in texts_by_role: continue
+        if text.startswith(IMAGE_PLACEHOLDER_PREFIX): image_turns += 1
+        else: texts_by_role[role].append(text)
+        if role == "user" and previous_role != "user": user_bursts += 1
+        if role == "model" and previous_role == "user": answered_bursts += 1
+        previous_role = role
+
+    def average_length(texts):
+        return round(sum(len(text) for text in texts) / len(texts), 1) if texts else 0
+
+    roles = [entry.get("role") for entry in history if isinstance(entry, dict)]
+    return {
+        "contact_key": contact_key_from_history_file(history_file),
+        "total_turns": len(history),
+        "user_turns": roles.count("user"),
+        "model_turns": roles.count("model"),
+        "image_turns": image_turns,
+        "archived_segments": len(manifest),
+        "user_bursts": user_bursts,
+        "answered_bursts": answered_bursts,
+        "first_role": roles[0] if roles else "",
+        "last_role": roles[-1] if roles else "",
+        "avg_user_chars": average_length(texts_by_role["user"]),
+        "avg_model_chars": average_length(texts_by_role["model"]),
+        "history_modified_at": int(os.path.getmtime(history_file)),
+    }
+
+
+def summarize_chat_file_task(task):
+    history_file, archive_folder = task
+    try:
+        return history_file, summarize_chat_file(history_file, archive_folder), None
+    except Exception as e: # Keep the pool running; the file is retried on the next export
+        return history_file, None, str(e)
+
+
+def scan_chat_files(history_folder, archive_folder, state_file, workers, full_rescan):
+    """Returns {history_file: row}, re-reading only files whose signature changed since the last run."""
+    previous_state = {} if full_rescan else {item["file"]: item for item in read_json_list(state_file) if isinstance(item, dict) and "file" in item}
+    history_files = sorted(glob.glob(os.path.join(history_folder, f"{HISTORY_FILE_PREFIX}*.json")))
+    rows, signatures, changed_files = {}, {}, []
+    for history_file in history_files:
+        signatures[history_file] = get_file_signature(history_file, archive_folder)
+        cached = previous_state.get(history_file)
+        if cached and cached.get("signature") == signatures[history_file] and cached.get("row"):
+            rows[history_file] = cached["row"]
+        else:
+            changed_files.append(history_file)
+    print(f"Found {len(history_files)} chat histories ({len(changed_files)} new or changed, {len(rows)} unchanged).")
+
+    failed = 0
+    if changed_files:
+        tasks = [(history_file, archive_folder) for history_file in changed_files]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for history_file, row, error in pool.map(summarize_chat_file_task, tasks, chunksize=max(1, len(tasks) // (workers * 4 or 1))):
+                if row is None:
+                    print(f"Warning: Could not summarize {history_file}: {error}")
+                    failed += 1
+                    continue
+                rows[history_file] = row
+
+    new_state = [{"file": history_file, "signature": signatures[history_file], "row": row} for history_file, row in rows.items()]
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump(new_state, f, ensure_ascii=False)
+    if failed: print(f"{failed} files failed and will be retried on the next run.")
+    return rows
+
+
+def load_outreach_ledger(filename):
+    if not os.path.exists(filename): return set()
+    with open(filename, 'r', encoding='utf-8') as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+def join_contact_data(chat_rows, contact_index_file, messaged_contacts_file, closed_leads_file):
+    """Adds contact identity, outreach and closing columns to each chat row."""
+    contacts_by_key = {record["contact_key"]: record for record in read_json_list(contact_index_file)
+                       if isinstance(record, dict) and record.get("contact_key")}
+    messaged_phones = load_outreach_ledger(messaged_contacts_file)
+    closings_by_key = {}
+    for record in read_jsonl(closed_leads_file):
+        closings_by_key.setdefault(record.get("contact_key"), []).append(record)
+
+    joined = []
+    for row in chat_rows:
+        contact = contacts_by_key.get(row["contact_key"], {})
+        contact_id = contact.get("contact_id", "")
+        phone = contact_id.split("@")[0] if contact_id.endswith("@c.us") else ""
+        closings = sorted(closings_by_key.get(row["contact_key"], []), key=lambda record: (record.get("closed_at") is None, record.get("closed_at") or 0))
+        first_closing = closings[0] if closings else {}
+        first_closed_at = first_closing.get("closed_at") # Missing in hand-edited or truncated records
+        first_seen = contact.get("first_seen")
+        seconds_to_close = round(first_closed_at - first_seen) if first_closed_at and first_seen else ""
+        joined.append(dict(row, **{
+            "contact_id": contact_id,
+            "display_name": (contact.get("aliases") or [""])[-1],
+            "aliases": "|".join(contact.get("aliases", [])),
+            "first_seen": int(first_seen) if first_seen else "",
+            "outreach_contacted": bool(phone and phone in messaged_phones),
+            "client_replied": row["user_turns"] > 0,
+            "reply_rate": round(row["answered_bursts"] / row["user_bursts"], 3) if row["user_bursts"] else "",
+            "closings": len(closings),
+            "first_closed_at": int(first_closed_at) if first_closed_at else "",
+            "turns_to_close": first_closing.get("history_turns", ""),
+            "seconds_to_close": seconds_to_close,
+        }))
+    return joined
+
+
+def write_csv(rows, output_file, columns):
+    with open(output_file, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_parquet(rows, output_file, columns):
+    # Empty strings mark missing values in the CSV; Parquet gets real nulls
+    table = pa.table({column: [None if row.get(column) == "" else row.get(column) for row in rows] for column in columns})
+    pq.write_table(table, output_file)
+
+
+def print_overview(rows):
+    outreach_rows = [row for row in rows if row["outreach_contacted"]]
+    answered = sum(row["answered_bursts"] for row in rows)
+    bursts = sum(row["user_bursts"] for row in rows)
+    closed = sum(1 for row in rows if row["closings"])
+    engaged = sum(1 for row in rows if row["model_turns"])
+    print(f"Contacts: {len(rows)} | Outreach contacts that replied: "
+          f"{sum(1 for row in outreach_rows if row['client_replied'])}/{len(outreach_rows)}")
+    print(f"Bot reply rate (answered user bursts): {answered}/{bursts}" + (f" ({answered / bursts:.1%})" if bursts else ""))
+    print(f"Closing-trigger rate: {closed}/{engaged} engaged contacts" + (f" ({closed / engaged:.1%})" if engaged else ""))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export per-contact analytics from WhatsApp chat histories.")
+    parser.add_argument("--history-folder", default=CHAT_HISTORY_BASE_FOLDER)
+    parser.add_argument("--archive-folder", default=None, help="Defaults to <history-folder>/archive")
+    parser.add_argument("--messaged-contacts", default=MESSAGED_CONTACTS_FILE)
+    parser.add_argument("--contact-index", default=CONTACT_INDEX_FILE)
+    parser.add_argument("--closed-leads", default=CLOSED_LEADS_FILE)
+    parser.add_argument("--state-file", default=ANALYTICS_STATE_FILE)
+    parser.add_argument("--output", default=None, help="Defaults to chat_analytics.csv or chat_analytics.parquet")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--full", action="store_true", help="Ignore the incremental state and re-read every file")
+    args = parser.parse_args(argv)
+
+    if args.format == "parquet" and pa is None:
+        print("ERROR: --format parquet requires pyarrow (pip install pyarrow).")
+        return 1
+    if not os.path.isdir(args.history_folder):
+        print(f"ERROR: History folder not found: {args.history_folder}")
+        return 1
+    archive_folder = args.archive_folder or os.path.join(args.history_folder, "archive")
+    output_file = args.output or f"chat_analytics.{args.format}"
+
+    started_at = time.perf_counter()
+    chat_rows = scan_chat_files(args.history_folder, archive_folder, args.state_file, max(1, args.workers), args.full)
+    rows = join_contact_data(sorted(chat_rows.values(), key=lambda row: row["contact_key"]),
+                             args.contact_index, args.messaged_contacts, args.closed_leads)
+    columns = CHAT_COLUMNS + JOINED_COLUMNS
+    if args.format == "parquet": write_parquet(rows, output_file, columns)
+    else: write_csv(rows, output_file, columns)
+    print(f"Wrote {len(rows)} contacts to {output_file} in {time.perf_counter() - started_at:.2f}s.")
+    print_overview(rows)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+"""
+Replays stored chat histories through the bot's reply pipeline without a browser.
+
+Every user burst in a stored conversation is turned into a reply call using the same context
+building (find_user_burst_start / build_reply_history / get_burst_texts), session cache,
+ModelCallClient (rate limiting, retries, coalescing) and closing-trigger handling as the live bot.
+Conversations run concurrently, and the report covers throughput, latency, token usage and how often
+FLOWTIVA_CLOSING_TRIGGER fires.
+
+Model backends:
+    fake      canned replies after a simulated latency; the trigger fires with --closing-probability
+    recorded  returns the model turn stored in the history (the stored turns have the trigger stripped)
+    live      real Gemini calls, optionally with a candidate prompt from --system-prompt-file
+
+Usage:
+    python tools/replay_conversations.py [--model fake|recorded|live] [--concurrency 8] [--limit 100]
+"""
+import argparse
+import glob
+import importlib.util
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+SCRIPT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Source code.py")
+
+
+def load_bot_module():
+    spec = importlib.util.spec_from_file_location("whatsapp_bot", SCRIPT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def estimate_tokens(contents):
+    """Rough token count (4 characters per token) for backends that do not report usage."""
+    return max(1, len(json.dumps(contents, default=str, ensure_ascii=False)) // 4)
+
+
+class FakeChatSession:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history)
+
+    def send_message(self, content):
+        reply_text = self.model.next_reply(self.history, content)
+        prompt_tokens = estimate_tokens([self.history, content])
+        self.history.append({"role": "user", "parts": content if isinstance(content, list) else [content]})
+        self.history.append({"role": "model", "parts": [reply_text]})
+        return SimpleNamespace(text=reply_text, usage_metadata=SimpleNamespace(
+            prompt_token_count=prompt_tokens, candidates_token_count=estimate_tokens(reply_text)))
+
+
+class FakeModel:
+    """Stands in for genai.GenerativeModel: canned or recorded replies after a simulated latency."""
+    def __init__(self, closing_trigger, closing_probability=0.0, latency_seconds=0.0, seed=0, recorded=False):
+        self.closing_trigger = closing_trigger
+        self.closing_probability = closing_probability
+        self.latency_seconds = latency_seconds
+        self.rng = random.Random(seed)
+        self.recorded = recorded
+        self.recorded_reply = None # Set by the replay loop before each call in recorded mode
+
+    def start_chat(self, history=None):
+        return FakeChatSession(self, history or [])
+
+    def next_reply(self, history, content):
+        if self.latency_seconds: time.sleep(self.rng.uniform(0.5, 1.5) * self.latency_seconds)
+        if self.recorded and self.recorded_reply is not None:
+            return self.recorded_reply
+        reply_text = f"Thanks for your message! (replay reply #{len(history) // 2 + 1})"
+        if self.rng.random() < self.closing_probability: reply_text += " " + self.closing_trigger
+        return reply_text
+
+
+class UnlimitedRateLimiter:
+    def acquire(self): pass
+    def try_acquire(self): return True
+    def penalize(self, seconds): pass
+
+
+def build_live_model(bot, system_prompt_file):
+    if not system_prompt_file:
+        return bot.jayakrishnan_reply_model
+    with open(system_prompt_file, 'r', encoding='utf-8') as f:
+        candidate_prompt = f.read()
+    return bot.genai.GenerativeModel(
+        model_name="gemini-2.0-flash",
+        generation_config=bot.jayakrishnan_reply_model_config,
+        system_instruction=candidate_prompt,
+    )
+
+
+def replay_conversation(bot, contact_key, chat_history, model, rate_limiter):
+    """Feeds one stored conversation burst by burst through the reply pipeline. Returns per-call stats."""
+    client = bot.ModelCallClient(model, f"replay:{contact_key}", rate_limiter=rate_limiter)
+    session_cache = bot.ChatSessionCache(client)
+    stored_history = []
+    calls = []
+    replaced_recorded_reply = False # The recorded model turns after a burst were replaced by the generated reply
+    for index, entry in enumerate(chat_history):
+        if not isinstance(entry, dict) or not entry.get("parts") or not isinstance(entry["parts"][0], str): continue
+        if entry.get("role") == "model" and replaced_recorded_reply: continue
+        replaced_recorded_reply = False
+        stored_history.append({"role": entry.get("role"), "parts": [entry["parts"][0]]})
+        next_entry = chat_history[index + 1] if index + 1 < len(chat_history) else None
+        if entry.get("role") != "user" or (next_entry and next_entry.get("role") == "user"):
+            continue # Not the end of a user burst
+        burst_start_index = bot.find_user_burst_start(stored_history)
+        burst_texts = bot.get_burst_texts(stored_history[burst_start_index:])
+        if not burst_texts: continue # Image-only burst; image bytes are not stored with the history
+        history_before_burst = bot.build_reply_history(stored_history, burst_start_index)
+        chat_session = session_cache.get_session(contact_key, stored_history[:burst_start_index], history_before_burst)
+        recorded_reply = next_entry["parts"][0] if next_entry and next_entry.get("parts") else None
+        if isinstance(model, FakeModel):
+            if model.recorded and recorded_reply is None: continue # Trailing burst the bot never answered
+            model.recorded_reply = recorded_reply
+
+        started_at = time.perf_counter()
+        try:
+            response = client.send_message(chat_session, burst_texts, coalesce_key=contact_key)
+            reply_text = (response.text or "").strip()
+        except Exception as e:
+            calls.append({"ok": False, "latency": time.perf_counter() - started_at, "error": f"{type(e).__name__}: {e}"})
+            continue
+        latency = time.perf_counter() - started_at
+        reply_to_client, closing_triggered = bot.split_closing_trigger(reply_text)
+        usage = getattr(response, "usage_metadata", None)
+        calls.append({
+            "ok": True, "latency": latency, "closing": closing_triggered, "burst_size": len(burst_texts),
+            "prompt_tokens": getattr(usage, "prompt_token_count", None) or estimate_tokens([history_before_burst, burst_texts]),
+            "output_tokens": getattr(usage, "candidates_token_count", None) or estimate_tokens(reply_text),
+        })
+        if reply_to_client:
+            # Record the generated reply like record_ai_reply_in_history does, so the next burst can reuse the session
+            stored_history.append({"role": "model", "parts": [reply_to_client]})
+            session_cache.mark_synced(contact_key, stored_history)
+            replaced_recorded_reply = True
+    return calls
+
+
+def percentile(values, fraction):
+    if not values: return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def build_report(results, wall_seconds, model_kind):
+    all_calls = [call for calls in results.values() for call in calls]
+    ok_calls = [call for call in all_calls if call["ok"]]
+    latencies = [call["latency"] for call in ok_calls]
+    closing_conversations = sum(1 for calls in results.values() if any(call.get("closing") for call in calls))
+    return {
+        "model": model_kind,
+        "conversations": len(results),
+        "calls": len(all_calls),
+        "failed_calls": len(all_calls) - len(ok_calls),
+        "wall_seconds": round(wall_seconds, 3),
+        "calls_per_second": round(len(ok_calls) / wall_seconds, 2) if wall_seconds else 0,
+        "conversations_per_second": round(len(results) / wall_seconds, 2) if wall_seconds else 0,
+        "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+        "prompt_tokens": sum(call["prompt_tokens"] for call in ok_calls),
+        "output_tokens": sum(call["output_tokens"] for call in ok_calls),
+        "avg_prompt_tokens_per_call": round(sum(call["prompt_tokens"] for call in ok_calls) / len(ok_calls), 1) if ok_calls else 0,
+        "closing_triggers": sum(1 for call in ok_calls if call["closing"]),
+        "closing_rate_per_call": round(sum(1 for call in ok_calls if call["closing"]) / len(ok_calls), 4) if ok_calls else 0,
+        "closing_rate_per_conversation": round(closing_conversations / len(results), 4) if results else 0,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay stored WhatsApp conversations through the reply pipeline.")
+    parser.add_argument("--model", choices=["fake", "recorded", "live"], default="fake")
+    parser.add_argument("--history-folder", default=None, help="Defaults to CHAT_HISTORY_BASE_FOLDER")
+    parser.add_argument("--limit", type=int, default=None, help="Replay at most this many conversations")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Simulated model latency (fake/recorded)")
+    parser.add_argument("--closing-probability", type=float, default=0.05, help="Chance a fake reply carries the closing trigger")
+    parser.add_argument("--rate-per-minute", type=float, default=None, help="Model rate limit; defaults to the bot's limit for live, unlimited otherwise")
+    parser.add_argument("--system-prompt-file", default=None, help="Candidate system prompt for --model live")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    bot = load_bot_module()
+    history_folder = args.history_folder or bot.CHAT_HISTORY_BASE_FOLDER
+    history_files = sorted(glob.glob(os.path.join(history_folder, "whatsapp_chat_*.json")))[:args.limit]
+    if not history_files:
+        print(f"No chat histories found in {history_folder}.")
+        return 1
+
+    if args.rate_per_minute: rate_limiter = bot.TokenBucket(args.rate_per_minute, bot.MODEL_RATE_BURST)
+    elif args.model == "live": rate_limiter = bot.get_model_rate_limiter("gemini-2.0-flash")
+    else: rate_limiter = UnlimitedRateLimiter() # No throttling for fake backends
+    live_model = build_live_model(bot, args.system_prompt_file) if args.model == "live" else None
+
+    def run_one(file_index, history_file):
+        contact_key = os.path.splitext(os.path.basename(history_file))[0][len("whatsapp_chat_"):]
+        if live_model is not None: model = live_model
+        else: model = FakeModel(bot.FLOWTIVA_CLOSING_TRIGGER, args.closing_probability, args.latency_ms / 1000.0,
+                                seed=args.seed + file_index, recorded=args.model == "recorded")
+        return contact_key, replay_conversation(bot, contact_key, bot.load_full_chat_history(history_file), model, rate_limiter)
+
+    print(f"Replaying {len(history_files)} conversations with the {args.model} model (concurrency {args.concurrency})...")
+    results = {}
+    started_at = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as pool:
+        for contact_key, calls in pool.map(lambda item: run_one(*item), enumerate(history_files)):
+            results[contact_key] = calls
+    report = build_report(results, time.perf_counter() - started_at, args.model)
+
+    print("\n--- Replay Report ---")
+    for key, value in report.items(): print(f"{key}: {value}")
+    if args.model == "recorded": print("Note: recorded replies have the closing trigger stripped, so the closing rate is always 0.")
+    if args.report_json:
+        with open(args.report_json, 'w', encoding='utf-8') as f: json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())